@@ -1,17 +1,100 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import and_, delete, func, insert, or_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
-from passlib.context import CryptContext
-from jose import jwt
-from datetime import datetime, timedelta
+import bcrypt
+import jwt
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed, wait
+from functools import lru_cache
+from itertools import islice, zip_longest
+import anyio
+import hashlib
+import orjson
+import os
+import re
 import requests
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 
-from database import engine, get_db, Base
+from database import engine, get_db, Base, SessionLocal
 from models import User, Portfolio, Transaction, Favorite
 
-Base.metadata.create_all(bind=engine)
+# Known MOEX tickers (without the .ME suffix)
+MOEX_TICKERS = frozenset({
+    'SBER', 'GAZP', 'LKOH', 'GMKN', 'ROSN', 'TATN', 'MGNT', 'NVTK', 'ALRS', 'PLZL', 'CHMF', 'SNGS', 'SNGSP',
+    'MOEX', 'VTBR', 'YNDX', 'POLY', 'PIKK', 'AFLT', 'RUAL', 'NLMK', 'MTSS', 'FIVE', 'OZON', 'TCSG', 'VKCO',
+})
+
+def init_db():
+    """Create missing tables and indexes"""
+    Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist, so add indexes introduced since explicitly
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    migrate_moex_symbols()
+
+def is_stale_moex_symbol(model):
+    """SQL filter for rows whose symbol is a known MOEX ticker not stored as TICKER.ME (bare, or as typed, e.g. vtbr.me)"""
+    symbol = func.upper(model.symbol)
+    suffixed = [f"{ticker}.ME" for ticker in MOEX_TICKERS]
+    return or_(symbol.in_(MOEX_TICKERS), and_(symbol.in_(suffixed), model.symbol.notin_(suffixed)))
+
+def migrate_moex_symbols():
+    """Move rows stored under a non-canonical MOEX symbol (e.g. VTBR or vtbr.me, from before normalize_symbol knew it) to TICKER.ME"""
+    with SessionLocal() as db:
+        # Positions: rename, or fold into an existing TICKER.ME position of the same user. Flushing
+        # each change lets a later variant of the same ticker (VTBR and vtbr) find the renamed row
+        for stale in db.query(Portfolio).filter(is_stale_moex_symbol(Portfolio)).order_by(Portfolio.id).all():
+            symbol = f"{stale.symbol.upper().replace('.ME', '')}.ME"
+            target = db.query(Portfolio).filter(Portfolio.user_id == stale.user_id, Portfolio.symbol == symbol).first()
+            if target is None:
+                stale.symbol = symbol
+            else:
+                quantity = target.quantity + stale.quantity
+                if quantity:
+                    target.avg_price = (target.avg_price * target.quantity + stale.avg_price * stale.quantity) / quantity
+                target.quantity = quantity
+                db.delete(stale)
+            db.flush()
+        
+        # Favorites: rename, or drop when the TICKER.ME favorite already exists
+        for stale in db.query(Favorite).filter(is_stale_moex_symbol(Favorite)).order_by(Favorite.id).all():
+            symbol = f"{stale.symbol.upper().replace('.ME', '')}.ME"
+            if db.query(Favorite).filter(Favorite.user_id == stale.user_id, Favorite.symbol == symbol).first():
+                db.delete(stale)
+            else:
+                stale.symbol = symbol
+            db.flush()
+        
+        # Transactions are history only, so bulk renames are enough: bare tickers get the suffix,
+        # suffixed ones in the wrong case are upper-cased
+        db.execute(
+            update(Transaction)
+            .where(func.upper(Transaction.symbol).in_(MOEX_TICKERS))
+            .values(symbol=func.upper(Transaction.symbol).concat(".ME"))
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(
+            update(Transaction)
+            .where(is_stale_moex_symbol(Transaction))
+            .values(symbol=func.upper(Transaction.symbol))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+# Schema setup is opt-in (INIT_DB=1) so worker processes don't each probe every table on boot
+if os.getenv("INIT_DB"):
+    init_db()
+
+CYRILLIC_RE = re.compile('[\u0400-\u04FF]')
 
 DEFAULT_STOCKS = ["AAPL", "GOOGL", "MSFT", "AMZN", "TSLA", "META", "NVDA", "NFLX", "SBER.ME", "GAZP.ME", "LKOH.ME", "YDEX.ME"]
 
@@ -23,8 +106,16 @@ CURRENCY_PAIRS = {
     "CNY": "USDCNY=X",
 }
 
-_currency_cache = {}
-_currency_cache_time = 0
+# Shared pool for fanning out blocking upstream requests (I/O bound, so threads overlap fine)
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="yahoo")
+# Single-symbol quote and history lookups get their own pool, so a page's one quote never
+# queues behind list, search or screener fan-outs
+_lookup_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="lookup")
+
+# (connect, read) timeouts for upstream calls, and the overall deadline for a fan-out:
+# a stuck symbol is reported as timed out instead of holding up the whole response
+UPSTREAM_TIMEOUT = (2, 3)
+FANOUT_DEADLINE = 3
 
 # Yahoo Finance proxy with full browser-like headers
 YAHOO_HEADERS = {
@@ -36,23 +127,158 @@ YAHOO_HEADERS = {
     "Cache-Control": "max-age=0",
 }
 
+# Per-host request budgets (requests per second, burst size) shared by all threads
+YAHOO_RATE_LIMIT = (10, 20)
+MOEX_RATE_LIMIT = (10, 20)
+
+class RateLimiter:
+    """Thread-safe token bucket: callers over budget sleep until their slot instead of being rejected"""
+    
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Reserve a token now; a negative balance is the queue of callers ahead of us
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+class RateLimitedAdapter(HTTPAdapter):
+    """HTTPAdapter that takes a token from its limiter before every request it sends"""
+    
+    def __init__(self, limiter: RateLimiter, **kwargs):
+        self.limiter = limiter
+        super().__init__(**kwargs)
+    
+    def send(self, request, **kwargs):
+        self.limiter.acquire()
+        return super().send(request, **kwargs)
+
+def create_session(headers: dict = None, rate_limit: tuple = None) -> requests.Session:
+    """Create a pooled keep-alive session so repeated calls reuse TCP/TLS connections"""
+    session = requests.Session()
+    # One retry for connect errors and retryable statuses, none for read timeouts: a hung upstream
+    # would otherwise hold an executor worker for several full read timeouts after its caller gave up
+    retry = Retry(total=1, read=0, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+    pool_options = dict(pool_connections=32, pool_maxsize=64, max_retries=retry, pool_block=False)
+    if rate_limit:
+        adapter = RateLimitedAdapter(RateLimiter(*rate_limit), **pool_options)
+    else:
+        adapter = HTTPAdapter(**pool_options)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+SESSION = create_session(YAHOO_HEADERS, YAHOO_RATE_LIMIT)
+MOEX_SESSION = create_session(rate_limit=MOEX_RATE_LIMIT)
+
+# Upstream response cache: request URL -> (expires_at, parsed JSON)
+_http_cache = {}
+_http_cache_lock = threading.Lock()
+HTTP_CACHE_MAX_ENTRIES = 2048
+
+# Per-endpoint TTLs in seconds (quotes of closed markets don't move, so they live longer until the open)
+QUOTE_TTL = 15
+QUOTE_TTL_CLOSED = 600
+HISTORY_TTL = 600
+CHART_HISTORY_TTL = 300
+SEARCH_TTL = 86400
+CURRENCY_TTL = 300
+
+def cached_get(url: str, ttl: int, params: dict = None):
+    """GET JSON from Yahoo through the shared session, serving repeats from a TTL cache"""
+    key = requests.Request("GET", url, params=params).prepare().url
+    now = time.time()
+    
+    with _http_cache_lock:
+        entry = _http_cache.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+    
+    resp = SESSION.get(url, params=params, timeout=UPSTREAM_TIMEOUT)
+    data = orjson.loads(resp.content)
+    if resp.status_code != 200:
+        return data
+    
+    with _http_cache_lock:
+        if len(_http_cache) >= HTTP_CACHE_MAX_ENTRIES:
+            for k in [k for k, (expires, _) in _http_cache.items() if expires <= now]:
+                del _http_cache[k]
+            # Still full: drop the oldest entries (dicts keep insertion order)
+            while len(_http_cache) >= HTTP_CACHE_MAX_ENTRIES:
+                del _http_cache[next(iter(_http_cache))]
+        _http_cache[key] = (now + ttl, data)
+    return data
+
+# Upstream fetches currently in flight: key -> Future shared by concurrent callers
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def single_flight(key: str, fn, *args):
+    """Run fn(*args) at most once at a time per key; concurrent callers wait for the same result"""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        is_owner = future is None
+        if is_owner:
+            future = Future()
+            _inflight[key] = future
+    
+    if not is_owner:
+        return future.result()
+    
+    try:
+        result = fn(*args)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+
+@lru_cache(maxsize=4096)
 def is_moex_symbol(symbol: str) -> bool:
     """Check if symbol is from MOEX exchange"""
-    if ".ME" in symbol.upper():
-        return True
-    symbol_clean = symbol.upper().replace('.ME', '')
-    moex_tickers = ['SBER', 'GAZP', 'LKOH', 'GMKN', 'ROSN', 'TATN', 'MGNT', 'NVTK', 'ALRS', 'PLZL', 'CHMF', 'SNGS', 'SNGSP', 'MOEX', 'VTBR', 'YNDX', 'POLY', 'PIKK', 'AFLT', 'RUAL', 'NLMK', 'MTSS', 'FIVE', 'OZON', 'TCSG', 'VKCO']
-    return symbol_clean in moex_tickers
+    symbol_upper = symbol.upper()
+    return ".ME" in symbol_upper or symbol_upper in MOEX_TICKERS
+
+def moex_cache_key(symbol: str):
+    """Quote cache key for a MOEX symbol (always TICKER.ME)"""
+    return f"{symbol.upper().replace('.ME', '')}.ME"
+
+def moex_quote(symbol: str, max_age: float = None):
+    """Get quote from MOEX, deduplicating concurrent fetches of the same symbol"""
+    cache_key = moex_cache_key(symbol)
+    cached = get_cached_quote(cache_key, max_age)
+    if cached:
+        return cached
+    return fetch_quote_once(cache_key, fetch_moex_quote, symbol)
+
+def rows_by_board(rows: list, board_idx: int) -> dict:
+    """Index ISS rows by BOARDID, keeping the first row seen for each board"""
+    return {row[board_idx]: row for row in reversed(rows)}
 
-def moex_quote(symbol: str):
+def fetch_moex_quote(symbol: str):
     """Fetch real-time quote from MOEX ISS API"""
     symbol_clean = symbol.upper().replace('.ME', '')
     
     # Get current market data
     url = f"https://iss.moex.com/iss/engines/stock/markets/shares/securities/{symbol_clean}.json"
     try:
-        resp = requests.get(url, timeout=10)
-        data = resp.json()
+        resp = MOEX_SESSION.get(url, timeout=UPSTREAM_TIMEOUT)
+        data = orjson.loads(resp.content)
         
         # Get marketdata (real-time prices)
         marketdata = data.get("marketdata", {})
@@ -64,35 +290,24 @@ def moex_quote(symbol: str):
         sec_columns = securities.get("columns", [])
         sec_rows = securities.get("data", [])
         
+        # ISS answers unknown securities with empty tables: a definite miss, unlike errors below
         if not md_rows or not sec_rows:
-            raise HTTPException(503, f"No MOEX data for {symbol_clean}")
+            raise HTTPException(404, f"No MOEX data for {symbol_clean}")
         
-        # Find the TQBR board (main trading board)
-        md_row = None
-        sec_row = None
-        for i, row in enumerate(md_rows):
-            board_idx = md_columns.index("BOARDID") if "BOARDID" in md_columns else 0
-            if row[board_idx] == "TQBR":
-                md_row = row
-                break
-        
-        for i, row in enumerate(sec_rows):
-            board_idx = sec_columns.index("BOARDID") if "BOARDID" in sec_columns else 1
-            if row[board_idx] == "TQBR":
-                sec_row = row
-                break
+        # Column name -> index, built once instead of list.index() per field
+        md_idx = {col: i for i, col in enumerate(md_columns)}
+        sec_idx = {col: i for i, col in enumerate(sec_columns)}
         
-        if not md_row:
-            md_row = md_rows[0]
-        if not sec_row:
-            sec_row = sec_rows[0]
+        # Prefer the TQBR board (main trading board), falling back to the first row
+        md_row = rows_by_board(md_rows, md_idx.get("BOARDID", 0)).get("TQBR", md_rows[0])
+        sec_row = rows_by_board(sec_rows, sec_idx.get("BOARDID", 1)).get("TQBR", sec_rows[0])
         
         # Parse marketdata
         def get_md(col):
-            return md_row[md_columns.index(col)] if col in md_columns else None
+            return md_row[md_idx[col]] if col in md_idx else None
         
         def get_sec(col):
-            return sec_row[sec_columns.index(col)] if col in sec_columns else None
+            return sec_row[sec_idx[col]] if col in sec_idx else None
         
         price = get_md("LAST") or get_md("LCURRENTPRICE") or get_sec("PREVPRICE") or 0
         prev_close = get_sec("PREVPRICE") or price
@@ -112,7 +327,7 @@ def moex_quote(symbol: str):
         currency_id = get_sec("CURRENCYID") or "SUR"  # SUR = Russian Ruble
         currency = "RUB" if currency_id in ["SUR", "RUB"] else currency_id
         
-        return {
+        quote = {
             "symbol": f"{symbol_clean}.ME",
             "name": name,
             "price": round(float(price), 2) if price else 0,
@@ -127,6 +342,8 @@ def moex_quote(symbol: str):
             "exchange": "MOEX",
             "currency": currency,
         }
+        store_quote(quote["symbol"], quote)
+        return quote
     except HTTPException:
         raise
     except Exception as e:
@@ -145,33 +362,35 @@ def moex_search(query: str):
     }
     
     try:
-        resp = requests.get(url, params=params, timeout=10)
-        data = resp.json()
+        resp = MOEX_SESSION.get(url, params=params, timeout=UPSTREAM_TIMEOUT)
+        data = orjson.loads(resp.content)
         
         securities = data.get("securities", {})
         columns = securities.get("columns", [])
         rows = securities.get("data", [])
         
+        col_idx = {col: i for i, col in enumerate(columns)}
+        
+        def get_col(row, col):
+            return row[col_idx[col]] if col in col_idx else None
+        
         results = []
         seen = set()
         for row in rows:
-            def get_col(col):
-                return row[columns.index(col)] if col in columns else None
-            
-            secid = get_col("secid")
+            secid = get_col(row, "secid")
             if not secid or secid in seen:
                 continue
             seen.add(secid)
             
             # Only include shares
-            sec_type = get_col("type")
+            sec_type = get_col(row, "type")
             if sec_type and sec_type not in ["common_share", "preferred_share"]:
                 continue
             
             results.append({
                 "symbol": f"{secid}.ME",
                 "displaySymbol": secid,
-                "name": get_col("name") or get_col("shortname") or secid,
+                "name": get_col(row, "name") or get_col(row, "shortname") or secid,
                 "exchange": "MOEX",
             })
         
@@ -180,7 +399,78 @@ def moex_search(query: str):
         print(f"MOEX search error: {e}")
         return []
 
-def yahoo_quote(symbol: str):
+# Parsed quote cache: symbol -> (fetched_at, quote)
+_quote_cache = {}
+_quote_lock = threading.Lock()
+
+# Negative cache for symbols upstream just reported as unknown: symbol -> (retry_at, error detail)
+_failed_quotes = {}
+FAILED_QUOTE_TTL = 60
+FAILED_QUOTE_MAX_ENTRIES = 1024
+
+# Upper bound on single-symbol quote fetches in flight at once, across all request threads
+QUOTE_FETCH_CONCURRENCY = 8
+_quote_fetch_slots = threading.BoundedSemaphore(QUOTE_FETCH_CONCURRENCY)
+
+def fetch_with_slot(fetch, symbol: str):
+    """Run a quote fetcher while holding one of the QUOTE_FETCH_CONCURRENCY slots"""
+    with _quote_fetch_slots:
+        return fetch(symbol)
+
+def get_cached_quote(symbol: str, max_age: float = None):
+    """Return a copy of a recently fetched quote, or None if missing or older than max_age (default: TTL by market state)"""
+    with _quote_lock:
+        fetched_at, quote = _quote_cache.get(symbol, (0, None))
+    if quote is None:
+        return None
+    if max_age is None:
+        max_age = QUOTE_TTL
+        # A CLOSED quote only keeps the long TTL while trading hours also say closed, so the
+        # first request after the open refetches (quotes from exchanges we can't place don't)
+        exchange_id = quote.get("exchange")
+        if quote.get("market_state") == "CLOSED" and exchange_id in EXCHANGES and is_exchange_surely_closed(exchange_id):
+            max_age = QUOTE_TTL_CLOSED
+    if time.time() - fetched_at >= max_age:
+        return None
+    return dict(quote)
+
+def store_quote(symbol: str, quote: dict):
+    """Remember a freshly fetched quote (callers decorate their copies, not this one)"""
+    with _quote_lock:
+        _quote_cache[symbol] = (time.time(), dict(quote))
+
+def fetch_quote_once(cache_key: str, fetch, symbol: str):
+    """Run a quote fetcher single-flight, failing fast for FAILED_QUOTE_TTL after it reports an unknown symbol (404)"""
+    now = time.time()
+    with _quote_lock:
+        retry_at, detail = _failed_quotes.get(cache_key, (0, None))
+    if retry_at > now:
+        raise HTTPException(404, detail)
+    
+    try:
+        # Waiters share the owner's result, so everyone gets their own copy to decorate
+        # (only the owner takes a fetch slot; waiters just block on its result)
+        return dict(single_flight(f"quote:{cache_key}", fetch_with_slot, fetch, symbol))
+    except HTTPException as e:
+        # Only definite misses are remembered; timeouts and upstream errors retry on the next request
+        if e.status_code == 404:
+            with _quote_lock:
+                if len(_failed_quotes) >= FAILED_QUOTE_MAX_ENTRIES:
+                    for k in [k for k, (expires, _) in _failed_quotes.items() if expires <= now]:
+                        del _failed_quotes[k]
+                    while len(_failed_quotes) >= FAILED_QUOTE_MAX_ENTRIES:
+                        del _failed_quotes[next(iter(_failed_quotes))]
+                _failed_quotes[cache_key] = (now + FAILED_QUOTE_TTL, e.detail)
+        raise
+
+def yahoo_quote(symbol: str, max_age: float = None):
+    """Get quote from Yahoo Finance, deduplicating concurrent fetches of the same symbol"""
+    cached = get_cached_quote(symbol, max_age)
+    if cached:
+        return cached
+    return fetch_quote_once(symbol, fetch_yahoo_quote, symbol)
+
+def fetch_yahoo_quote(symbol: str):
     """Fetch quote from Yahoo Finance API"""
     urls = [
         f"https://query2.finance.yahoo.com/v8/finance/chart/{symbol}?interval=1d&range=2d",
@@ -188,20 +478,21 @@ def yahoo_quote(symbol: str):
     ]
     
     data = None
+    not_found = False
     for url in urls:
         try:
-            resp = requests.get(url, headers=YAHOO_HEADERS, timeout=10)
-            print(f"Yahoo {symbol}: status={resp.status_code}, len={len(resp.text)}")
-            if resp.status_code == 200 and resp.text:
-                data = resp.json()
-                if "chart" in data and data["chart"]["result"]:
-                    break
+            data = cached_get(url, QUOTE_TTL)
+            if "chart" in data and data["chart"]["result"]:
+                break
+            # A chart response without a result is Yahoo saying the symbol doesn't exist
+            not_found = not_found or "chart" in data
         except Exception as e:
             print(f"Yahoo {symbol} error: {e}")
             continue
     
     if not data or "chart" not in data or not data["chart"]["result"]:
-        raise HTTPException(503, f"No data for {symbol}")
+        # Timeouts and upstream errors are 503 (worth retrying), a definite miss is 404
+        raise HTTPException(404 if not_found else 503, f"No data for {symbol}")
     
     result = data["chart"]["result"][0]
     meta = result["meta"]
@@ -221,7 +512,7 @@ def yahoo_quote(symbol: str):
     exchange = "NASDAQ" if "NASDAQ" in exchange_name.upper() else "NYSE" if "NYSE" in exchange_name.upper() else exchange_name
     currency = meta.get("currency", "USD")
     
-    return {
+    quote = {
         "symbol": symbol,
         "name": meta.get("shortName") or meta.get("longName") or symbol,
         "price": round(price, 2),
@@ -236,19 +527,113 @@ def yahoo_quote(symbol: str):
         "exchange": exchange,
         "currency": currency,
     }
+    store_quote(symbol, quote)
+    return quote
 
-def get_quote_universal(symbol: str):
-    """Get quote from appropriate exchange API"""
+# Symbols per v7 quote request (longer lists are split across requests)
+QUOTE_BATCH_SIZE = 20
+
+def yahoo_quote_batch(symbols: list) -> dict:
+    """Fetch quotes for many symbols in batched Yahoo requests of QUOTE_BATCH_SIZE, keyed by symbol"""
+    quotes = {}
+    missing = []
+    for symbol in symbols:
+        cached = get_cached_quote(symbol)
+        if cached:
+            quotes[symbol] = cached
+        else:
+            missing.append(symbol)
+    if not missing:
+        return quotes
+    
+    results = []
+    url = "https://query1.finance.yahoo.com/v7/finance/quote"
+    for i in range(0, len(missing), QUOTE_BATCH_SIZE):
+        try:
+            resp = SESSION.get(url, params={"symbols": ",".join(missing[i:i + QUOTE_BATCH_SIZE])}, timeout=UPSTREAM_TIMEOUT)
+            data = orjson.loads(resp.content)
+            results.extend(data.get("quoteResponse", {}).get("result") or [])
+        except Exception as e:
+            print(f"Yahoo batch quote error: {e}")
+    
+    for q in results:
+        symbol = q.get("symbol")
+        price = q.get("regularMarketPrice")
+        if not symbol or price is None:
+            continue
+        
+        prev_close = q.get("regularMarketPreviousClose", price)
+        market_time = q.get("regularMarketTime", 0)
+        exchange_name = q.get("fullExchangeName") or q.get("exchange", "")
+        exchange = "NASDAQ" if "NASDAQ" in exchange_name.upper() else "NYSE" if "NYSE" in exchange_name.upper() else exchange_name
+        
+        quotes[symbol] = {
+            "symbol": symbol,
+            "name": q.get("shortName") or q.get("longName") or symbol,
+            "price": round(price, 2),
+            "change": round(q.get("regularMarketChangePercent", 0), 2),
+            "prev_close": round(prev_close, 2),
+            "open": round(q.get("regularMarketOpen", prev_close), 2),
+            "high": round(q.get("regularMarketDayHigh", 0), 2),
+            "low": round(q.get("regularMarketDayLow", 0), 2),
+            "volume": q.get("regularMarketVolume", 0),
+            "market_state": q.get("marketState", "UNKNOWN"),
+            "last_update": datetime.fromtimestamp(market_time).isoformat() if market_time else None,
+            "exchange": exchange,
+            "currency": q.get("currency", "USD"),
+        }
+        store_quote(symbol, quotes[symbol])
+    return quotes
+
+def get_quote_universal(symbol: str, max_age: float = None):
+    """Get quote from appropriate exchange API (cached quotes older than max_age are refetched)"""
     if is_moex_symbol(symbol):
-        return moex_quote(symbol)
+        return moex_quote(symbol, max_age)
     else:
-        return yahoo_quote(symbol)
+        return yahoo_quote(symbol, max_age)
+
+def get_quote_bounded(symbol: str, max_age: float = None):
+    """get_quote_universal for a single request path, giving up with a 504 after FANOUT_DEADLINE"""
+    cached = get_cached_quote_universal(symbol, max_age)
+    if cached:
+        return cached
+    # A fetch already running at the deadline still completes in the background and fills the cache
+    future = _lookup_executor.submit(get_quote_universal, symbol, max_age)
+    try:
+        return future.result(timeout=FANOUT_DEADLINE)
+    except FuturesTimeout:
+        future.cancel()
+        raise HTTPException(504, f"Timed out fetching {symbol}")
+
+def get_cached_quote_universal(symbol: str, max_age: float = None):
+    """Return a fresh cached quote for any exchange's symbol, or None"""
+    return get_cached_quote(moex_cache_key(symbol) if is_moex_symbol(symbol) else symbol, max_age)
+
+def get_quotes_universal(symbols: list) -> dict:
+    """Get quotes keyed by symbol: US ones in one batched Yahoo request, the rest concurrently (failures omitted)"""
+    quotes = yahoo_quote_batch([s for s in symbols if not is_moex_symbol(s)])
+    futures = {s: _executor.submit(get_quote_universal, s) for s in symbols if s not in quotes}
+    wait(futures.values(), timeout=FANOUT_DEADLINE)
+    for symbol, future in futures.items():
+        if not future.done():
+            # Still queued: drop it so it doesn't hold a worker nobody waits for
+            future.cancel()
+            print(f"Timed out fetching {symbol}")
+            continue
+        try:
+            quotes[symbol] = future.result()
+        except Exception as e:
+            print(f"Error fetching {symbol}: {e}")
+    return quotes
 
 def yahoo_history(symbol: str):
+    """Get 1 month history from Yahoo Finance, deduplicating concurrent fetches"""
+    return single_flight(f"history:{symbol}", fetch_yahoo_history, symbol)
+
+def fetch_yahoo_history(symbol: str):
     """Fetch 1 month history from Yahoo Finance"""
     url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}?interval=1d&range=1mo"
-    resp = requests.get(url, headers=YAHOO_HEADERS, timeout=10)
-    data = resp.json()
+    data = cached_get(url, HISTORY_TTL)
     
     if "chart" not in data or not data["chart"]["result"]:
         return []
@@ -257,18 +642,45 @@ def yahoo_history(symbol: str):
     timestamps = result.get("timestamp", [])
     closes = result.get("indicators", {}).get("quote", [{}])[0].get("close", [])
     
-    history = []
-    for ts, close in zip(timestamps, closes):
-        if close:
-            date = datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
-            history.append({"date": date, "price": round(close, 2)})
-    return history
+    # time.strftime on a struct_time skips building a datetime per row
+    localtime, strftime = time.localtime, time.strftime
+    return [
+        {"date": strftime("%Y-%m-%d", localtime(ts)), "price": round(close, 2)}
+        for ts, close in zip(timestamps, closes) if close
+    ]
 
-app = FastAPI()
+# Route handlers are plain `def` on purpose: they do blocking I/O (requests, psycopg2), which
+# FastAPI runs in its worker threadpool. Declaring them `async def` without an async DB driver and
+# HTTP client would run that blocking I/O on the event loop and stall every other request.
+app = FastAPI(default_response_class=ORJSONResponse)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
-pwd_context = CryptContext(schemes=["bcrypt"])
+# Concurrent sync handlers per worker (anyio's default is 40, which queues requests under bursts)
+THREADPOOL_TOKENS = 200
+
+@app.on_event("startup")
+async def raise_threadpool_limit():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_TOKENS
+
+# Deliberate bcrypt cost; existing higher-cost hashes still verify. Auth handlers are sync
+# so FastAPI runs them in its threadpool, and bcrypt releases the GIL while hashing.
+BCRYPT_ROUNDS = 10
+
+def hash_password(password: str) -> str:
+    """Hash a password with bcrypt at BCRYPT_ROUNDS"""
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
+
+def verify_password(password: str, password_hash: str) -> bool:
+    """Check a password against a stored bcrypt hash"""
+    try:
+        return bcrypt.checkpw(password.encode(), password_hash.encode())
+    except ValueError:
+        return False
+
 SECRET_KEY = "your-secret-key-change-in-production"
+JWT_ALGORITHM = "HS256"
+JWT_ALGORITHMS = (JWT_ALGORITHM,)
+JWT_DECODE_OPTIONS = {"verify_aud": False}
 
 class UserCreate(BaseModel):
     username: str
@@ -283,20 +695,33 @@ class TradeRequest(BaseModel):
     quantity: float
     action: str
 
-def get_current_user(token: str, db: Session):
+@lru_cache(maxsize=10000)
+def decode_token(token: str):
+    """Verify a JWT once and remember its (sub, exp); failures are not cached"""
+    payload = jwt.decode(token, SECRET_KEY, algorithms=JWT_ALGORITHMS, options=JWT_DECODE_OPTIONS)
+    return payload["sub"], payload.get("exp")
+
+def get_current_user(token: str, db: Session, load_portfolio: bool = False):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        user = db.query(User).filter(User.username == payload["sub"]).first()
-        return user
-    except:
+        username, exp = decode_token(token)
+    except (jwt.PyJWTError, KeyError):
         raise HTTPException(401, "Invalid token")
+    # Cached decodes skip jwt's own expiry check, so re-check it here
+    if exp is not None and exp <= time.time():
+        raise HTTPException(401, "Token expired")
+    query = db.query(User)
+    if load_portfolio:
+        # Fetch user and positions in a single round-trip
+        query = query.options(joinedload(User.portfolio))
+    user = query.filter(User.username == username).first()
+    return user
 
 @app.post("/api/register")
 def register(data: UserCreate, db: Session = Depends(get_db)):
     if db.query(User).filter(User.username == data.username).first():
         raise HTTPException(400, "Username exists")
     display = data.display_name if data.display_name else data.username
-    user = User(username=data.username, display_name=display, password_hash=pwd_context.hash(data.password))
+    user = User(username=data.username, display_name=display, password_hash=hash_password(data.password))
     db.add(user)
     db.commit()
     return {"message": "Registered"}
@@ -304,20 +729,34 @@ def register(data: UserCreate, db: Session = Depends(get_db)):
 @app.post("/api/login")
 def login(data: UserCreate, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.username == data.username).first()
-    if not user or not pwd_context.verify(data.password, user.password_hash):
+    if not user or not verify_password(data.password, user.password_hash):
         raise HTTPException(401, "Invalid credentials")
-    token = jwt.encode({"sub": user.username, "exp": datetime.utcnow() + timedelta(days=7)}, SECRET_KEY)
+    token = jwt.encode({"sub": user.username, "exp": datetime.utcnow() + timedelta(days=7)}, SECRET_KEY, algorithm=JWT_ALGORITHM)
     return {"token": token, "username": user.username, "display_name": user.display_name or user.username}
 
 @app.get("/api/me")
 def get_me(token: str, db: Session = Depends(get_db)):
-    user = get_current_user(token, db)
-    portfolio = db.query(Portfolio).filter(Portfolio.user_id == user.id).all()
+    user = get_current_user(token, db, load_portfolio=True)
+    portfolio = user.portfolio
+    
+    # One batched lookup for all holdings, served from the quote cache where fresh and bounded by
+    # FANOUT_DEADLINE; a symbol that can't be fetched in time gets a None price
+    quotes = get_quotes_universal(sorted({p.symbol for p in portfolio}))
+    holdings = []
+    for p in portfolio:
+        quote = quotes.get(p.symbol)
+        holdings.append({
+            "symbol": p.symbol,
+            "quantity": p.quantity,
+            "avg_price": p.avg_price,
+            "price": quote["price"] if quote else None,
+            "currency": quote.get("currency") if quote else None,
+        })
     return {
         "username": user.username,
         "display_name": user.display_name or user.username,
         "balance": user.balance,
-        "portfolio": [{"symbol": p.symbol, "quantity": p.quantity, "avg_price": p.avg_price} for p in portfolio]
+        "portfolio": holdings
     }
 
 @app.post("/api/deposit")
@@ -350,20 +789,20 @@ def update_username(data: UpdateUsernameRequest, token: str, db: Session = Depen
     db.commit()
     
     # Generate new token with new username
-    new_token = jwt.encode({"sub": user.username}, SECRET_KEY, algorithm="HS256")
+    new_token = jwt.encode({"sub": user.username}, SECRET_KEY, algorithm=JWT_ALGORITHM)
     return {"message": "Логин изменён", "username": user.username, "token": new_token}
 
 @app.put("/api/account/password")
 def update_password(data: UpdatePasswordRequest, token: str, db: Session = Depends(get_db)):
     user = get_current_user(token, db)
     
-    if not pwd_ctx.verify(data.current_password, user.password_hash):
+    if not verify_password(data.current_password, user.password_hash):
         raise HTTPException(400, "Неверный текущий пароль")
     
     if len(data.new_password) < 4:
         raise HTTPException(400, "Пароль должен быть не менее 4 символов")
     
-    user.password_hash = pwd_ctx.hash(data.new_password)
+    user.password_hash = hash_password(data.new_password)
     db.commit()
     return {"message": "Пароль изменён"}
 
@@ -381,24 +820,47 @@ def update_display_name(data: UpdateDisplayNameRequest, token: str, db: Session
     db.commit()
     return {"message": "Имя изменено", "display_name": user.display_name}
 
-# Cache for screener data (Yahoo doesn't support offset, so we fetch all and paginate locally)
+# Cache for screener data (Yahoo doesn't support offset, so we fetch all and paginate locally):
+# screener type -> (fetched_at, stocks). Entries past the TTL are served stale while a
+# background refresh runs; only entries past SCREENER_STALE_TTL make a request wait.
 _screener_cache = {}
-_screener_cache_time = {}
+_screener_refreshing = set()
+_screener_lock = threading.Lock()
 SCREENER_CACHE_TTL = 60  # 1 minute cache
+SCREENER_STALE_TTL = 600
 
 def fetch_yahoo_screener(screener_type: str, limit: int = 15, offset: int = 0):
     """Fetch stocks from Yahoo Finance screener API with local pagination"""
-    global _screener_cache, _screener_cache_time
-    
-    now = time.time()
-    
-    # Check cache first
-    if screener_type in _screener_cache and (now - _screener_cache_time.get(screener_type, 0)) < SCREENER_CACHE_TTL:
-        all_stocks = _screener_cache[screener_type]
-        paginated = all_stocks[offset:offset+limit]
-        has_more = (offset + limit) < len(all_stocks)
-        return paginated, has_more
+    fetched_at, all_stocks = _screener_cache.get(screener_type, (0, None))
+    age = time.time() - fetched_at
+    
+    if all_stocks is None or age >= SCREENER_STALE_TTL:
+        all_stocks = single_flight(f"screener:{screener_type}", refresh_screener, screener_type)
+    elif age >= SCREENER_CACHE_TTL:
+        with _screener_lock:
+            start_refresh = screener_type not in _screener_refreshing
+            _screener_refreshing.add(screener_type)
+        if start_refresh:
+            _executor.submit(refresh_screener, screener_type)
     
+    # Return paginated results
+    paginated = all_stocks[offset:offset+limit]
+    has_more = (offset + limit) < len(all_stocks)
+    return paginated, has_more
+
+def refresh_screener(screener_type: str):
+    """Reload a screener into the cache; an empty result doesn't replace earlier data"""
+    try:
+        all_stocks = load_screener(screener_type)
+        if all_stocks or screener_type not in _screener_cache:
+            _screener_cache[screener_type] = (time.time(), all_stocks)
+        return _screener_cache[screener_type][1]
+    finally:
+        with _screener_lock:
+            _screener_refreshing.discard(screener_type)
+
+def load_screener(screener_type: str):
+    """Fetch the full stock list for a screener from Yahoo"""
     # Yahoo screener IDs
     screeners = {
         "gainers": "day_gainers",
@@ -414,28 +876,38 @@ def fetch_yahoo_screener(screener_type: str, limit: int = 15, offset: int = 0):
     if screener_type == "trending":
         try:
             url = "https://query1.finance.yahoo.com/v1/finance/trending/US"
-            resp = requests.get(url, headers=YAHOO_HEADERS, timeout=10)
-            data = resp.json()
+            resp = SESSION.get(url, timeout=UPSTREAM_TIMEOUT)
+            data = orjson.loads(resp.content)
             quotes = data.get("finance", {}).get("result", [{}])[0].get("quotes", [])
             symbols = [q.get("symbol") for q in quotes if q.get("symbol")]
             
-            for symbol in symbols[:50]:  # Limit to 50 for performance
-                try:
-                    quote = yahoo_quote(symbol)
+            symbols = symbols[:50]  # Limit to 50 for performance
+            # One batched quote request (plus a concurrent fan-out for misses) instead of 50 serial ones.
+            # Trending/US symbols are Yahoo-US by definition, so they skip the MOEX routing of
+            # get_quotes_universal (FIVE, OZON, POLY and MOEX are also MOEX tickers)
+            quotes = yahoo_quote_batch(symbols)
+            futures = {s: _executor.submit(yahoo_quote, s) for s in symbols if s not in quotes}
+            wait(futures.values(), timeout=FANOUT_DEADLINE)
+            for symbol, future in futures.items():
+                if future.done() and not future.exception():
+                    quotes[symbol] = future.result()
+                else:
+                    future.cancel()
+                    print(f"Error fetching trending {symbol}: {future.exception() if future.done() else 'timeout'}")
+            for symbol in symbols:
+                quote = quotes.get(symbol)
+                if quote:
                     quote["displaySymbol"] = normalize_symbol(quote["symbol"], for_display=True)
                     quote["category"] = "trending"
                     all_stocks.append(quote)
-                except:
-                    pass
-                time.sleep(0.05)
         except Exception as e:
             print(f"Trending fetch error: {e}")
     else:
         # Use screener API for gainers/losers/active - fetch 100 at once
         try:
             url = f"https://query1.finance.yahoo.com/v1/finance/screener/predefined/saved?formatted=false&lang=en-US&region=US&scrIds={screener_id}&count=100"
-            resp = requests.get(url, headers=YAHOO_HEADERS, timeout=10)
-            data = resp.json()
+            resp = SESSION.get(url, timeout=UPSTREAM_TIMEOUT)
+            data = orjson.loads(resp.content)
             
             result = data.get("finance", {}).get("result", [{}])[0]
             quotes = result.get("quotes", [])
@@ -455,23 +927,91 @@ def fetch_yahoo_screener(screener_type: str, limit: int = 15, offset: int = 0):
                         "category": screener_type
                     }
                     all_stocks.append(stock)
-                except:
+                except AttributeError:
+                    # Not a quote object
                     pass
         except Exception as e:
             print(f"Screener fetch error for {screener_type}: {e}")
     
-    # Cache the results
-    _screener_cache[screener_type] = all_stocks
-    _screener_cache_time[screener_type] = now
-    
-    # Return paginated results
-    paginated = all_stocks[offset:offset+limit]
-    has_more = (offset + limit) < len(all_stocks)
-    return paginated, has_more
+    return all_stocks
+
+def quote_or_stub(symbol: str, category: str, quote: dict = None):
+    """Fetch quote for a stock list row (unless already batched), returning an error stub instead of raising"""
+    try:
+        if quote is None:
+            quote = get_quote_universal(symbol)
+        quote["displaySymbol"] = normalize_symbol(quote["symbol"], for_display=True)
+        quote["category"] = category
+        return quote
+    except Exception as e:
+        print(f"Error fetching {symbol}: {e}")
+        return stock_stub(symbol, category, str(e))
+
+def stock_stub(symbol: str, category: str, error: str):
+    """Placeholder row for a stock whose quote could not be fetched"""
+    return {
+        "symbol": symbol,
+        "displaySymbol": normalize_symbol(symbol, for_display=True),
+        "name": symbol,
+        "price": None,
+        "change": None,
+        "exchange": "MOEX" if is_moex_symbol(symbol) else "US",
+        "category": category,
+        "error": error
+    }
+
+def fetch_stock_list(symbols: list, category: str = "default"):
+    """Fetch quotes for a list of symbols, keeping order and stubbing failures and timeouts"""
+    # US stocks come back in one batched request and cached MOEX quotes are used as-is;
+    # only the remaining symbols are fetched individually
+    quotes = yahoo_quote_batch([s for s in symbols if not is_moex_symbol(s)])
+    for symbol in symbols:
+        if symbol not in quotes and is_moex_symbol(symbol):
+            cached = get_cached_quote_universal(symbol)
+            if cached:
+                quotes[symbol] = cached
+    futures = {symbol: _executor.submit(quote_or_stub, symbol, category) for symbol in symbols if symbol not in quotes}
+    wait(futures.values(), timeout=FANOUT_DEADLINE)
+    
+    rows = []
+    for symbol in symbols:
+        if symbol in quotes:
+            rows.append(quote_or_stub(symbol, category, quotes[symbol]))
+        elif futures[symbol].done():
+            rows.append(futures[symbol].result())
+        else:
+            futures[symbol].cancel()
+            rows.append(stock_stub(symbol, category, "timeout"))
+    return rows
+
+def stream_stock_list(symbols: list):
+    """Yield NDJSON rows for the stock list, each as soon as its quote arrives"""
+    snapshot = get_snapshot("stocks")
+    if snapshot:
+        by_symbol = {stock["symbol"]: stock for stock in snapshot}
+        for symbol in symbols:
+            if symbol in by_symbol:
+                yield orjson.dumps(by_symbol[symbol]) + b"\n"
+        return
+    
+    futures = {_executor.submit(quote_or_stub, symbol, "default"): symbol for symbol in symbols}
+    pending = dict(futures)
+    try:
+        for future in as_completed(futures, timeout=FANOUT_DEADLINE):
+            del pending[future]
+            yield orjson.dumps(future.result()) + b"\n"
+    except FuturesTimeout:
+        # A future can finish between the timeout and this sweep, so send its row rather than a stub
+        for future, symbol in pending.items():
+            if future.done():
+                yield orjson.dumps(future.result()) + b"\n"
+            else:
+                future.cancel()
+                yield orjson.dumps(stock_stub(symbol, "default", "timeout")) + b"\n"
 
 @app.get("/api/stocks")
-def get_stocks(category: str = "default", limit: int = 15, offset: int = 0):
-    """Fetch stocks from appropriate source based on category with pagination"""
+def get_stocks(category: str = "default", limit: int = 15, offset: int = 0, stream: bool = False):
+    """Fetch stocks from appropriate source based on category with pagination (stream=true sends NDJSON)"""
     
     # Handle special categories with pagination
     if category in ["gainers", "losers", "active", "trending"]:
@@ -480,28 +1020,15 @@ def get_stocks(category: str = "default", limit: int = 15, offset: int = 0):
             return {"stocks": stocks, "has_more": has_more, "offset": offset + len(stocks)}
         return {"stocks": [], "has_more": False, "offset": offset}
     
-    # Default: fetch static stock list (no pagination needed for small list)
-    stocks = []
-    stock_list = DEFAULT_STOCKS[offset:offset+limit]
-    for symbol in stock_list:
-        try:
-            quote = get_quote_universal(symbol)
-            quote["displaySymbol"] = normalize_symbol(quote["symbol"], for_display=True)
-            quote["category"] = "default"
-            stocks.append(quote)
-        except Exception as e:
-            print(f"Error fetching {symbol}: {e}")
-            stocks.append({
-                "symbol": symbol,
-                "displaySymbol": normalize_symbol(symbol, for_display=True),
-                "name": symbol,
-                "price": None,
-                "change": None,
-                "exchange": "MOEX" if is_moex_symbol(symbol) else "US",
-                "category": "default",
-                "error": str(e)
-            })
-        time.sleep(0.1)
+    if stream:
+        return StreamingResponse(stream_stock_list(DEFAULT_STOCKS[offset:offset+limit]), media_type="application/x-ndjson")
+    
+    # Default: static stock list, served from the background snapshot when it's fresh
+    snapshot = get_snapshot("stocks")
+    if snapshot:
+        stocks = snapshot[offset:offset+limit]
+    else:
+        stocks = fetch_stock_list(DEFAULT_STOCKS[offset:offset+limit])
     has_more = (offset + limit) < len(DEFAULT_STOCKS)
     return {"stocks": stocks, "has_more": has_more, "offset": offset + len(stocks)}
 
@@ -509,23 +1036,29 @@ def get_stocks(category: str = "default", limit: int = 15, offset: int = 0):
 def get_stock(symbol: str):
     """Get single stock with history from appropriate exchange API"""
     normalized_symbol = normalize_symbol(symbol)
-    quote = get_quote_universal(normalized_symbol)
     
-    # Get history from appropriate API
+    # History comes from the appropriate API in parallel with the quote
     if is_moex_symbol(normalized_symbol):
-        quote["history"] = moex_history(normalized_symbol, "1mo")
+        history_future = _lookup_executor.submit(moex_history, normalized_symbol, "1mo")
     else:
-        quote["history"] = yahoo_history(normalized_symbol)
+        history_future = _lookup_executor.submit(yahoo_history, normalized_symbol)
     
+    quote = get_quote_bounded(normalized_symbol)
+    try:
+        quote["history"] = history_future.result(timeout=FANOUT_DEADLINE)
+    except FuturesTimeout:
+        history_future.cancel()
+        print(f"Timed out fetching history for {normalized_symbol}")
+        quote["history"] = []
     quote["displaySymbol"] = normalize_symbol(quote["symbol"], for_display=True)
     return quote
 
 @app.get("/api/quote/{symbol}")
 def get_quote(symbol: str):
     """Quick quote for single symbol from appropriate exchange"""
-    return get_quote_universal(symbol)
+    return get_quote_bounded(symbol)
 
-# Exchange info with trading hours (UTC offset in hours, open/close in local time)
+# Exchange info with trading hours (standard-time UTC offset in hours, open/close in local time)
 EXCHANGES = {
     "NASDAQ": {
         "symbol": "AAPL", 
@@ -534,7 +1067,8 @@ EXCHANGES = {
         "utc_offset": -5,  # EST
         "open_hour": 9, "open_min": 30,
         "close_hour": 16, "close_min": 0,
-        "weekend_closed": True
+        "weekend_closed": True,
+        "observes_dst": True
     },
     "NYSE": {
         "symbol": "JPM", 
@@ -543,7 +1077,8 @@ EXCHANGES = {
         "utc_offset": -5,
         "open_hour": 9, "open_min": 30,
         "close_hour": 16, "close_min": 0,
-        "weekend_closed": True
+        "weekend_closed": True,
+        "observes_dst": True
     },
     "MOEX": {
         "symbol": "SBER.ME", 
@@ -561,7 +1096,8 @@ EXCHANGES = {
         "utc_offset": 0,
         "open_hour": 8, "open_min": 0,
         "close_hour": 16, "close_min": 30,
-        "weekend_closed": True
+        "weekend_closed": True,
+        "observes_dst": True
     },
     "XETRA": {
         "symbol": "SAP.DE", 
@@ -570,7 +1106,8 @@ EXCHANGES = {
         "utc_offset": 1,
         "open_hour": 9, "open_min": 0,
         "close_hour": 17, "close_min": 30,
-        "weekend_closed": True
+        "weekend_closed": True,
+        "observes_dst": True
     },
     "HKEX": {
         "symbol": "0005.HK", 
@@ -592,13 +1129,11 @@ EXCHANGES = {
     },
 }
 
-def is_exchange_open(exchange_info: dict) -> bool:
-    """Calculate if exchange is open based on current UTC time and exchange hours"""
-    from datetime import timezone
-    
-    utc_now = datetime.now(timezone.utc)
-    offset = timedelta(hours=exchange_info["utc_offset"])
-    local_now = utc_now + offset
+@lru_cache(maxsize=128)
+def exchange_open_at(exchange_id: str, minute: int, dst_shift: int = 0) -> bool:
+    """Whether an exchange's trading hours cover the given UTC minute (since the epoch)"""
+    exchange_info = EXCHANGES[exchange_id]
+    local_now = datetime.fromtimestamp(minute * 60, timezone.utc) + timedelta(hours=exchange_info["utc_offset"] + dst_shift)
     
     # Check weekend
     if exchange_info.get("weekend_closed", True) and local_now.weekday() >= 5:
@@ -610,29 +1145,41 @@ def is_exchange_open(exchange_info: dict) -> bool:
     
     return open_minutes <= current_minutes < close_minutes
 
+def is_exchange_open(exchange_id: str) -> bool:
+    """Calculate if exchange is open based on current UTC time and exchange hours (memoized per minute)"""
+    return exchange_open_at(exchange_id, int(time.time() // 60))
+
+def is_exchange_surely_closed(exchange_id: str) -> bool:
+    """True when trading hours say closed (with or without daylight saving, where observed), so no quote can say otherwise"""
+    minute = int(time.time() // 60)
+    observes_dst = EXCHANGES[exchange_id].get("observes_dst", False)
+    return not exchange_open_at(exchange_id, minute) and not (observes_dst and exchange_open_at(exchange_id, minute, 1))
+
 @app.get("/api/markets")
 def get_markets_status():
     """Get market status for all major exchanges"""
+    # Representative quotes in one batched fetch, skipping exchanges that are closed by the clock
+    # (nights, weekends); EXCHANGES uses standard-time offsets, so borderline hours still ask upstream
+    closed = {exchange_id for exchange_id in EXCHANGES if is_exchange_surely_closed(exchange_id)}
+    quotes = get_quotes_universal([info["symbol"] for exchange_id, info in EXCHANGES.items() if exchange_id not in closed])
+    
     results = []
     for exchange_id, info in EXCHANGES.items():
-        # First try Yahoo Finance for real-time status
-        try:
-            quote = yahoo_quote(info["symbol"])
-            market_state = quote.get("market_state")
-            # If Yahoo returns REGULAR, market is definitely open
-            if market_state == "REGULAR":
-                is_open = True
-            # If Yahoo returns something else (CLOSED, PRE, POST), use it
-            elif market_state and market_state != "UNKNOWN":
-                is_open = False
-            # Otherwise calculate from trading hours
-            else:
-                is_open = is_exchange_open(info)
-                market_state = "REGULAR" if is_open else "CLOSED"
-        except Exception as e:
-            print(f"Market status error for {exchange_id}: {e}")
-            # Fallback to time-based calculation
-            is_open = is_exchange_open(info)
+        quote = quotes.get(info["symbol"])
+        market_state = quote.get("market_state") if quote else None
+        # Closed by the clock either way
+        if exchange_id in closed:
+            is_open = False
+            market_state = "CLOSED"
+        # If the quote reports REGULAR, market is definitely open
+        elif market_state == "REGULAR":
+            is_open = True
+        # If it reports something else (CLOSED, PRE, POST), use it
+        elif market_state and market_state != "UNKNOWN":
+            is_open = False
+        # Otherwise (no quote or unknown state) calculate from trading hours
+        else:
+            is_open = is_exchange_open(exchange_id)
             market_state = "REGULAR" if is_open else "CLOSED"
         
         results.append({
@@ -643,7 +1190,6 @@ def get_markets_status():
             "state": market_state,
             "representative": info["symbol"],
         })
-        time.sleep(0.05)
     
     any_open = any(r["is_open"] for r in results)
     return {
@@ -651,17 +1197,54 @@ def get_markets_status():
         "exchanges": results
     }
 
+@lru_cache(maxsize=4096)
 def normalize_symbol(symbol: str, for_display: bool = False) -> str:
     """Normalize symbol: add .ME for MOEX if needed, or remove for display"""
     if for_display:
         return symbol.replace('.ME', '')
-    # Common MOEX tickers - add .ME if not present
-    moex_tickers = ['SBER', 'GAZP', 'LKOH', 'GMKN', 'ROSN', 'TATN', 'MGNT', 'NVTK', 'ALRS', 'PLZL', 'CHMF', 'SNGS', 'SNGSP', 'MOEX', 'YNDX']
+    # Known MOEX tickers - add .ME if not present
     symbol_upper = symbol.upper().replace('.ME', '')
-    if symbol_upper in moex_tickers and not symbol.endswith('.ME'):
+    if symbol_upper in MOEX_TICKERS and not symbol.endswith('.ME'):
         return f"{symbol_upper}.ME"
     return symbol
 
+def yahoo_direct_match(ticker: str) -> list:
+    """Search result for a query that is itself a Yahoo ticker, or nothing"""
+    try:
+        quote = yahoo_quote(ticker)
+    except Exception as e:
+        print(f"Direct quote for {ticker} failed: {e}")
+        return []
+    return [{
+        "symbol": quote["symbol"],
+        "displaySymbol": quote["symbol"],
+        "name": quote["name"],
+        "exchange": quote.get("exchange", "US"),
+    }]
+
+def yahoo_search(q: str) -> list:
+    """Equity matches from the Yahoo Finance search API (MOEX listings excluded)"""
+    url = f"https://query2.finance.yahoo.com/v1/finance/search?q={q}&quotesCount=10&newsCount=0"
+    results = []
+    try:
+        data = cached_get(url, SEARCH_TTL)
+        for quote in data.get("quotes", []):
+            if quote.get("quoteType") == "EQUITY":
+                symbol = quote.get("symbol")
+                # Skip MOEX symbols from Yahoo (we already have them from MOEX API)
+                if ".ME" in symbol:
+                    continue
+                exchange_name = quote.get("exchange", "")
+                results.append({
+                    "symbol": symbol,
+                    "displaySymbol": symbol,
+                    "name": quote.get("shortname") or quote.get("longname", ""),
+                    "exchange": exchange_name,
+                })
+    except Exception as e:
+        print(f"Yahoo search error: {e}")
+    return results
+
 @app.get("/api/search")
 def search_stocks(q: str, exchange: str = None):
     """Search stocks by symbol or name on specific or all exchanges"""
@@ -669,49 +1252,31 @@ def search_stocks(q: str, exchange: str = None):
     q_upper = q.upper()
     results = []
     
-    # Search on MOEX first (for Russian queries or explicit MOEX search)
-    is_cyrillic = any('\u0400' <= c <= '\u04FF' for c in q)
+    # MOEX (for Russian queries or explicit MOEX search), the direct ticker quote and
+    # Yahoo search are independent upstream calls, so run them concurrently
+    is_cyrillic = CYRILLIC_RE.search(q) is not None
     should_search_moex = exchange == "MOEX" or is_cyrillic or is_moex_symbol(q_upper)
     
+    futures = []
     if should_search_moex or exchange is None:
-        moex_results = moex_search(q)
-        results.extend(moex_results)
-    
-    # Search on Yahoo Finance (for US/International stocks)
+        futures.append(_executor.submit(moex_search, q))
     if exchange != "MOEX":
         # Try direct quote first if it looks like a ticker
         if len(q_upper) <= 6 and q_upper.replace('.', '').isalnum() and not is_moex_symbol(q_upper):
-            try:
-                quote = yahoo_quote(q_upper)
-                results.append({
-                    "symbol": quote["symbol"],
-                    "displaySymbol": quote["symbol"],
-                    "name": quote["name"],
-                    "exchange": quote.get("exchange", "US"),
-                })
-            except:
-                pass
-        
-        # Yahoo Finance search API
-        url = f"https://query2.finance.yahoo.com/v1/finance/search?q={q}&quotesCount=10&newsCount=0"
+            futures.append(_executor.submit(yahoo_direct_match, q_upper))
+        futures.append(_executor.submit(yahoo_search, q))
+    
+    # Merge in the original priority order: MOEX, direct quote, Yahoo search
+    wait(futures, timeout=FANOUT_DEADLINE)
+    for future in futures:
+        if not future.done():
+            future.cancel()
+            print(f"Search lookup for {q!r} timed out")
+            continue
         try:
-            resp = requests.get(url, headers=YAHOO_HEADERS, timeout=10)
-            data = resp.json()
-            for quote in data.get("quotes", []):
-                if quote.get("quoteType") == "EQUITY":
-                    symbol = quote.get("symbol")
-                    # Skip MOEX symbols from Yahoo (we already have them from MOEX API)
-                    if ".ME" in symbol:
-                        continue
-                    exchange_name = quote.get("exchange", "")
-                    results.append({
-                        "symbol": symbol,
-                        "displaySymbol": symbol,
-                        "name": quote.get("shortname") or quote.get("longname", ""),
-                        "exchange": exchange_name,
-                    })
+            results.extend(future.result())
         except Exception as e:
-            print(f"Yahoo search error: {e}")
+            print(f"Search error: {e}")
     
     # Remove duplicates
     seen = set()
@@ -724,34 +1289,85 @@ def search_stocks(q: str, exchange: str = None):
     
     return unique_results[:20]
 
+def fetch_currency_rate(pair: str) -> float:
+    """Fetch a single USD-based exchange rate from Yahoo Finance"""
+    url = f"https://query2.finance.yahoo.com/v8/finance/chart/{pair}?interval=1d&range=1d"
+    data = cached_get(url, CURRENCY_TTL)
+    if "chart" in data and data["chart"]["result"]:
+        return round(data["chart"]["result"][0]["meta"].get("regularMarketPrice", 0), 4)
+    return None
+
 @app.get("/api/currencies")
 def get_currencies():
-    """Get current exchange rates (USD base)"""
-    global _currency_cache, _currency_cache_time
-    
-    # Cache for 5 minutes
-    if time.time() - _currency_cache_time < 300 and _currency_cache:
-        return _currency_cache
-    
+    """Get current exchange rates (USD base), served from the background snapshot when it's fresh"""
+    return get_snapshot("fx") or fetch_currency_rates()
+
+def fetch_currency_rates():
+    """Fetch all exchange rates from Yahoo, cached for CURRENCY_TTL"""
     rates = {"USD": 1.0}
-    for currency, pair in CURRENCY_PAIRS.items():
+    pair_to_currency = {pair: currency for currency, pair in CURRENCY_PAIRS.items()}
+    
+    # All pairs in one batched request
+    url = "https://query1.finance.yahoo.com/v7/finance/quote"
+    try:
+        data = cached_get(url, CURRENCY_TTL, params={"symbols": ",".join(CURRENCY_PAIRS.values())})
+        for item in data.get("quoteResponse", {}).get("result") or []:
+            currency = pair_to_currency.get(item.get("symbol"))
+            if currency and item.get("regularMarketPrice"):
+                rates[currency] = round(item["regularMarketPrice"], 4)
+    except Exception as e:
+        print(f"Currency batch error: {e}")
+    
+    # Fall back to per-pair chart requests for anything the batch missed
+    futures = {currency: _executor.submit(fetch_currency_rate, pair) for currency, pair in CURRENCY_PAIRS.items() if currency not in rates}
+    wait(futures.values(), timeout=FANOUT_DEADLINE)
+    for currency, future in futures.items():
+        if not future.done():
+            future.cancel()
+            print(f"Currency {currency} timed out")
+            rates[currency] = 0
+            continue
         try:
-            url = f"https://query2.finance.yahoo.com/v8/finance/chart/{pair}?interval=1d&range=1d"
-            resp = requests.get(url, headers=YAHOO_HEADERS, timeout=10)
-            data = resp.json()
-            if "chart" in data and data["chart"]["result"]:
-                rate = data["chart"]["result"][0]["meta"].get("regularMarketPrice", 0)
-                rates[currency] = round(rate, 4)
+            rate = future.result()
+            if rate is not None:
+                rates[currency] = rate
         except Exception as e:
             print(f"Currency {currency} error: {e}")
             rates[currency] = 0
-        time.sleep(0.2)
-    
-    _currency_cache = rates
-    _currency_cache_time = time.time()
     return rates
 
+# Background snapshot of the default stock list and FX rates: key -> (refreshed_at, data)
+_snapshot = {}
+SNAPSHOT_INTERVAL = QUOTE_TTL  # refreshing faster would only hit the quote cache
+SNAPSHOT_MAX_AGE = 3 * SNAPSHOT_INTERVAL  # fall back to live fetches if the refresher stalls
+
+def get_snapshot(key: str):
+    """Return snapshot data if it was refreshed recently, otherwise None"""
+    refreshed_at, data = _snapshot.get(key, (0, None))
+    if time.time() - refreshed_at < SNAPSHOT_MAX_AGE:
+        return data
+    return None
+
+def refresh_loop():
+    """Keep /api/stocks and /api/currencies snapshots warm so requests are plain memory reads"""
+    while True:
+        try:
+            _snapshot["stocks"] = (time.time(), fetch_stock_list(DEFAULT_STOCKS))
+            _snapshot["fx"] = (time.time(), fetch_currency_rates())
+        except Exception as e:
+            print(f"Snapshot refresh error: {e}")
+        time.sleep(SNAPSHOT_INTERVAL)
+
+@app.on_event("startup")
+def start_refresher():
+    threading.Thread(target=refresh_loop, name="snapshot-refresher", daemon=True).start()
+
 def moex_history(symbol: str, period: str = "1mo"):
+    """Get historical data from MOEX, deduplicating concurrent fetches"""
+    key = f"history:{symbol.replace('.ME', '').upper()}:{period}"
+    return single_flight(key, fetch_moex_history, symbol, period)
+
+def fetch_moex_history(symbol: str, period: str = "1mo"):
     """Get historical data from MOEX ISS API"""
     # Remove .ME suffix if present
     symbol_clean = symbol.replace('.ME', '').upper()
@@ -787,12 +1403,17 @@ def moex_history(symbol: str, period: str = "1mo"):
     params = {
         "from": start_date.strftime("%Y-%m-%d"),
         "till": end_date.strftime("%Y-%m-%d"),
-        "interval": interval
+        "interval": interval,
+        # Only the block and columns parsed below: ISS otherwise sends ~25 columns per row
+        # plus metadata and the cursor block, most of the payload
+        "iss.meta": "off",
+        "iss.only": "history",
+        "history.columns": "BOARDID,TRADEDATE,OPEN,LOW,HIGH,CLOSE",
     }
     
     try:
-        resp = requests.get(url, params=params, timeout=10)
-        data = resp.json()
+        resp = MOEX_SESSION.get(url, params=params, timeout=UPSTREAM_TIMEOUT)
+        data = orjson.loads(resp.content)
         
         history_data = data.get("history", {})
         columns = history_data.get("columns", [])
@@ -808,72 +1429,89 @@ def moex_history(symbol: str, period: str = "1mo"):
         low_idx = columns.index("LOW") if "LOW" in columns else None
         close_idx = columns.index("CLOSE") if "CLOSE" in columns else 11
         
+        # Everything that doesn't depend on the row is resolved before the loop:
+        # the optional OHLC columns present in this payload and the date format
+        ohlc_columns = [(key, idx) for key, idx in (("open", open_idx), ("high", high_idx), ("low", low_idx)) if idx is not None]
+        hourly = period in ("1d", "5d") and interval == "60"
+        min_len = close_idx + 1
+        
         history = []
-        seen_dates = set()
+        append = history.append
+        prev_date = None
         
+        # ISS returns rows date-ordered with one row per board; the stable sort is a no-op
+        # pass for that, and makes duplicate dates adjacent even if it ever isn't
+        rows = sorted((row for row in rows if len(row) >= min_len), key=lambda row: row[date_idx] or "")
         for row in rows:
-            if len(row) > close_idx and row[close_idx] is not None:
-                date = row[date_idx]
-                
-                # Skip duplicate dates (different boards)
-                if date in seen_dates:
-                    continue
-                seen_dates.add(date)
-                
-                close_price = float(row[close_idx])
-                
-                if period in ["1d", "5d"] and interval == "60":
-                    try:
-                        dt = datetime.strptime(date, "%Y-%m-%d %H:%M:%S")
-                        date = dt.strftime("%H:%M")
-                    except:
-                        pass
-                
-                item = {"date": date, "price": round(close_price, 2), "close": round(close_price, 2)}
-                
-                # Add OHLC data for candlestick charts
-                if open_idx is not None and row[open_idx] is not None:
-                    item["open"] = round(float(row[open_idx]), 2)
-                if high_idx is not None and row[high_idx] is not None:
-                    item["high"] = round(float(row[high_idx]), 2)
-                if low_idx is not None and row[low_idx] is not None:
-                    item["low"] = round(float(row[low_idx]), 2)
-                
-                history.append(item)
+            close = row[close_idx]
+            if close is None:
+                continue
+            date = row[date_idx]
+            
+            # Skip duplicate dates (different boards)
+            if date == prev_date:
+                continue
+            prev_date = date
+            
+            close_price = float(close)
+            
+            # "YYYY-MM-DD HH:MM:SS" -> "HH:MM" by slicing; plain dates are left as they are
+            if hourly and date and len(date) == 19:
+                date = date[11:16]
+            
+            close_price = round(close_price, 2)
+            item = {"date": date, "price": close_price, "close": close_price}
+            
+            # Add OHLC data for candlestick charts
+            for key, idx in ohlc_columns:
+                value = row[idx]
+                if value is not None:
+                    item[key] = round(float(value), 2)
+            
+            append(item)
         
         return history
     except Exception as e:
         print(f"MOEX history error for {symbol_clean}: {e}")
         return []
 
+# Chart periods accepted by /api/stock/{symbol}/history, and the Yahoo bar size for the
+# intraday ones (everything else uses daily bars)
+VALID_PERIODS = frozenset({"1d", "5d", "1mo", "3mo", "6mo", "1y", "5y"})
+PERIOD_INTERVAL = {"1d": "5m", "5d": "15m"}
+
 @app.get("/api/stock/{symbol}/history")
-def get_stock_history(symbol: str, period: str = "1mo"):
-    """Get stock history for different periods"""
+def get_stock_history(symbol: str, period: str = "1mo", format: str = None):
+    """Get stock history for different periods (format=columnar returns one array per field instead of row objects)"""
+    history = load_stock_history(symbol, period)
+    if format == "columnar":
+        return history_columns(history)
+    return history
+
+# Fields of a columnar history response ("price" duplicates "close", so it's left out)
+HISTORY_COLUMNS = ("date", "open", "high", "low", "close")
+
+def history_columns(history: list) -> dict:
+    """Turn history rows into {field: [values]}, with None where a row lacks a field"""
+    return {field: [row.get(field) for row in history] for field in HISTORY_COLUMNS}
+
+def load_stock_history(symbol: str, period: str = "1mo"):
+    """Get stock history rows from the appropriate exchange API"""
     # Normalize symbol (add .ME if needed)
     normalized_symbol = normalize_symbol(symbol)
     
-    # Check if it's a MOEX ticker
-    is_moex = ".ME" in normalized_symbol or normalized_symbol.upper().replace('.ME', '') in ['SBER', 'GAZP', 'LKOH', 'GMKN', 'ROSN', 'TATN', 'MGNT', 'NVTK', 'ALRS', 'PLZL', 'CHMF', 'SNGS', 'SNGSP', 'MOEX']
-    
-    if is_moex:
+    if is_moex_symbol(normalized_symbol):
         # Use MOEX API for Russian stocks
         return moex_history(normalized_symbol, period)
     
     # Use Yahoo Finance for other stocks
-    valid_periods = ["1d", "5d", "1mo", "3mo", "6mo", "1y", "5y"]
-    if period not in valid_periods:
+    if period not in VALID_PERIODS:
         period = "1mo"
-    
-    interval = "1d"
-    if period == "1d":
-        interval = "5m"
-    elif period == "5d":
-        interval = "15m"
+    interval = PERIOD_INTERVAL.get(period, "1d")
     
     url = f"https://query2.finance.yahoo.com/v8/finance/chart/{normalized_symbol}?interval={interval}&range={period}"
     try:
-        resp = requests.get(url, headers=YAHOO_HEADERS, timeout=10)
-        data = resp.json()
+        data = cached_get(url, CHART_HISTORY_TTL)
         
         if "chart" not in data or not data["chart"]["result"]:
             return []
@@ -890,39 +1528,44 @@ def get_stock_history(symbol: str, period: str = "1mo"):
         if not timestamps or not closes:
             return []
         
+        # Pick the date format once; time.strftime on a struct_time skips building a datetime per row
+        date_format = "%H:%M" if period in ["1d", "5d"] else "%Y-%m-%d"
+        localtime, strftime = time.localtime, time.strftime
+        
+        # Walk the columns in lockstep (shorter ones padded with None) instead of
+        # bounds-checking and indexing four lists per row
+        rows = islice(zip_longest(timestamps, closes, opens, highs, lows), len(timestamps))
+        
         history = []
-        for i, ts in enumerate(timestamps):
-            close = closes[i] if i < len(closes) else None
+        append = history.append
+        for ts, close, open_, high, low in rows:
             if close:
-                if period in ["1d", "5d"]:
-                    date = datetime.fromtimestamp(ts).strftime("%H:%M")
-                else:
-                    date = datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
-                
-                item = {"date": date, "price": round(close, 2)}
+                close = round(close, 2)
+                item = {"date": strftime(date_format, localtime(ts)), "price": close}
                 
                 # Add OHLC data for candlestick charts
-                if i < len(opens) and opens[i]:
-                    item["open"] = round(opens[i], 2)
-                if i < len(highs) and highs[i]:
-                    item["high"] = round(highs[i], 2)
-                if i < len(lows) and lows[i]:
-                    item["low"] = round(lows[i], 2)
-                item["close"] = round(close, 2)
+                if open_:
+                    item["open"] = round(open_, 2)
+                if high:
+                    item["high"] = round(high, 2)
+                if low:
+                    item["low"] = round(low, 2)
+                item["close"] = close
                 
-                history.append(item)
+                append(item)
         return history
     except Exception as e:
         print(f"Yahoo history error: {e}")
         return []
 
-def convert_to_usd(amount: float, from_currency: str) -> float:
-    """Convert amount from any currency to USD"""
+def convert_to_usd(amount: float, from_currency: str, rates: dict = None) -> float:
+    """Convert amount from any currency to USD (pass rates to reuse one get_currencies() result)"""
     if not from_currency or from_currency.upper() == "USD":
         return amount
     
     # Get current exchange rate
-    rates = get_currencies()
+    if rates is None:
+        rates = get_currencies()
     from_rate = rates.get(from_currency.upper(), 1)
     
     if from_rate <= 0:
@@ -931,22 +1574,30 @@ def convert_to_usd(amount: float, from_currency: str) -> float:
     # Convert to USD: amount / rate
     return amount / from_rate
 
-def convert_from_usd(amount: float, to_currency: str) -> float:
-    """Convert amount from USD to any currency"""
+def convert_from_usd(amount: float, to_currency: str, rates: dict = None) -> float:
+    """Convert amount from USD to any currency (pass rates to reuse one get_currencies() result)"""
     if not to_currency or to_currency.upper() == "USD":
         return amount
     
-    rates = get_currencies()
+    if rates is None:
+        rates = get_currencies()
     to_rate = rates.get(to_currency.upper(), 1)
     
     return amount * to_rate
 
+# Oldest cached quote a trade may execute against, in seconds
+MAX_TRADE_STALENESS = 30
+
+def get_price(symbol: str):
+    """Quote for trade execution: from the quote cache if recent enough, otherwise fetched live"""
+    return get_quote_bounded(symbol, max_age=MAX_TRADE_STALENESS)
+
 @app.post("/api/trade")
 def trade(data: TradeRequest, token: str, db: Session = Depends(get_db)):
     user = get_current_user(token, db)
     # Normalize symbol (add .ME if needed)
     normalized_symbol = normalize_symbol(data.symbol)
-    quote = get_quote_universal(normalized_symbol)
+    quote = get_price(normalized_symbol)
     
     native_price = quote["price"]  # Price in stock's native currency
     stock_currency = quote.get("currency", "USD")
@@ -960,75 +1611,72 @@ def trade(data: TradeRequest, token: str, db: Session = Depends(get_db)):
             raise HTTPException(400, f"Insufficient funds. Need ${total_usd:.2f}, have ${user.balance:.2f}")
         user.balance -= total_usd
         
-        position = db.query(Portfolio).filter(Portfolio.user_id == user.id, Portfolio.symbol == normalized_symbol).first()
-        if position:
-            new_qty = position.quantity + data.quantity
-            # Store avg_price in USD
-            position.avg_price = (position.avg_price * position.quantity + total_usd) / new_qty
-            position.quantity = new_qty
-        else:
-            db.add(Portfolio(user_id=user.id, symbol=normalized_symbol, quantity=data.quantity, avg_price=price_usd))
+        # Open or grow the position in one statement (avg_price is stored in USD)
+        upsert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+        stmt = upsert(Portfolio).values(user_id=user.id, symbol=normalized_symbol, quantity=data.quantity, avg_price=price_usd)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "symbol"],
+            set_={
+                "quantity": Portfolio.quantity + stmt.excluded.quantity,
+                "avg_price": (Portfolio.avg_price * Portfolio.quantity + total_usd) / (Portfolio.quantity + stmt.excluded.quantity),
+            },
+        )
+        db.execute(stmt)
     
     elif data.action == "sell":
-        position = db.query(Portfolio).filter(Portfolio.user_id == user.id, Portfolio.symbol == normalized_symbol).first()
-        if not position or position.quantity < data.quantity:
+        # Check and decrement the position in one conditional UPDATE, so concurrent sells can't oversell
+        position = Portfolio.user_id == user.id, Portfolio.symbol == normalized_symbol
+        remaining = db.execute(
+            update(Portfolio)
+            .where(*position, Portfolio.quantity >= data.quantity)
+            .values(quantity=Portfolio.quantity - data.quantity)
+            .returning(Portfolio.quantity)
+        ).scalar()
+        if remaining is None:
             raise HTTPException(400, "Not enough shares")
-        position.quantity -= data.quantity
         user.balance += total_usd
-        if position.quantity == 0:
-            db.delete(position)
+        if remaining == 0:
+            db.execute(delete(Portfolio).where(*position))
     
-    db.add(Transaction(user_id=user.id, symbol=normalized_symbol, action=data.action, quantity=data.quantity, price=price_usd, total=total_usd))
+    db.execute(insert(Transaction).values(user_id=user.id, symbol=normalized_symbol, action=data.action, quantity=data.quantity, price=price_usd, total=total_usd))
     db.commit()
     return {"message": "Trade executed", "balance": user.balance, "price": price_usd, "native_price": native_price, "currency": stock_currency}
 
 @app.get("/api/transactions")
-def get_transactions(token: str, db: Session = Depends(get_db)):
+def get_transactions(token: str, limit: int = Query(50, ge=1, le=200), offset: int = Query(0, ge=0), before: datetime = Query(None), db: Session = Depends(get_db)):
+    """Newest-first transaction history; page with offset, or with before=<date of last row> for stable keyset paging"""
     user = get_current_user(token, db)
-    txs = db.query(Transaction).filter(Transaction.user_id == user.id).order_by(Transaction.created_at.desc()).all()
-    return [{"symbol": t.symbol, "displaySymbol": normalize_symbol(t.symbol, for_display=True), "action": t.action, "quantity": t.quantity, "price": t.price, "total": t.total, "date": str(t.created_at)} for t in txs]
+    # Plain column tuples: no ORM identity map or instance state per row
+    query = db.query(Transaction.symbol, Transaction.action, Transaction.quantity, Transaction.price, Transaction.total, Transaction.created_at)
+    query = query.filter(Transaction.user_id == user.id)
+    if before is not None:
+        query = query.filter(Transaction.created_at < before)
+    rows = query.order_by(Transaction.created_at.desc()).limit(limit).offset(offset).all()
+    return ORJSONResponse([
+        {"symbol": symbol, "displaySymbol": normalize_symbol(symbol, for_display=True), "action": action, "quantity": quantity, "price": price, "total": total, "date": str(created_at)}
+        for symbol, action, quantity, price, total, created_at in rows
+    ])
 
 # Favorites API
 @app.get("/api/favorites")
 def get_favorites(token: str, db: Session = Depends(get_db)):
     """Get user's favorite stocks"""
     user = get_current_user(token, db)
-    favs = db.query(Favorite).filter(Favorite.user_id == user.id).all()
-    return [f.symbol for f in favs]
+    return [symbol for symbol, in db.query(Favorite.symbol).filter(Favorite.user_id == user.id)]
 
 @app.get("/api/favorites/stocks")
 def get_favorite_stocks(token: str, limit: int = 15, offset: int = 0, db: Session = Depends(get_db)):
     """Get user's favorite stocks with full data"""
     user = get_current_user(token, db)
-    favs = db.query(Favorite).filter(Favorite.user_id == user.id).all()
-    symbols = [f.symbol for f in favs]
+    symbols = [symbol for symbol, in db.query(Favorite.symbol).filter(Favorite.user_id == user.id)]
     
     if not symbols:
         return {"stocks": [], "has_more": False, "offset": 0}
     
-    stocks = []
-    paginated_symbols = symbols[offset:offset+limit]
-    for symbol in paginated_symbols:
-        try:
-            quote = get_quote_universal(symbol)
-            quote["displaySymbol"] = normalize_symbol(quote["symbol"], for_display=True)
-            quote["category"] = "favorites"
-            quote["isFavorite"] = True
-            stocks.append(quote)
-        except Exception as e:
-            print(f"Error fetching favorite {symbol}: {e}")
-            stocks.append({
-                "symbol": symbol,
-                "displaySymbol": normalize_symbol(symbol, for_display=True),
-                "name": symbol,
-                "price": None,
-                "change": None,
-                "exchange": "MOEX" if is_moex_symbol(symbol) else "US",
-                "category": "favorites",
-                "isFavorite": True,
-                "error": str(e)
-            })
-        time.sleep(0.05)
+    # Same batched fetch as the main stock list
+    stocks = fetch_stock_list(symbols[offset:offset+limit], "favorites")
+    for stock in stocks:
+        stock["isFavorite"] = True
     
     has_more = (offset + limit) < len(symbols)
     return {"stocks": stocks, "has_more": has_more, "offset": offset + len(stocks)}
@@ -1042,14 +1690,14 @@ def add_favorite(req: FavoriteRequest, token: str, db: Session = Depends(get_db)
     user = get_current_user(token, db)
     symbol = normalize_symbol(req.symbol)
     
-    # Check if already in favorites
-    existing = db.query(Favorite).filter(Favorite.user_id == user.id, Favorite.symbol == symbol).first()
-    if existing:
-        return {"message": "Already in favorites", "symbol": symbol}
-    
+    # The unique (user_id, symbol) index rejects duplicates, so no existence check up front
     fav = Favorite(user_id=user.id, symbol=symbol)
     db.add(fav)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return {"message": "Already in favorites", "symbol": symbol}
     return {"message": "Added to favorites", "symbol": symbol}
 
 @app.delete("/api/favorites/{symbol}")
@@ -1076,70 +1724,116 @@ def get_market_indices():
         {"symbol": "IMOEX.ME", "name": "MOEX"},
     ]
     
+    # All indices are Yahoo symbols (IMOEX.ME included): one batched request, with
+    # concurrent single fetches for anything the batch missed
+    quotes = yahoo_quote_batch([idx["symbol"] for idx in indices])
+    futures = {idx["symbol"]: _executor.submit(yahoo_quote, idx["symbol"]) for idx in indices if idx["symbol"] not in quotes}
+    wait(futures.values(), timeout=FANOUT_DEADLINE)
+    for symbol, future in futures.items():
+        if future.done() and not future.exception():
+            quotes[symbol] = future.result()
+        else:
+            future.cancel()
+            print(f"Error fetching index {symbol}: {future.exception() if future.done() else 'timeout'}")
+    
     results = []
     for idx in indices:
-        try:
-            quote = yahoo_quote(idx["symbol"])
-            results.append({
-                "symbol": idx["symbol"],
-                "name": idx["name"],
-                "price": quote.get("price"),
-                "change": quote.get("change"),
-            })
-        except:
-            results.append({
-                "symbol": idx["symbol"],
-                "name": idx["name"],
-                "price": None,
-                "change": None,
-            })
-        time.sleep(0.05)
+        quote = quotes.get(idx["symbol"]) or {}
+        results.append({
+            "symbol": idx["symbol"],
+            "name": idx["name"],
+            "price": quote.get("price"),
+            "change": quote.get("change"),
+        })
     
     return results
 
+# Rendered reports: user id -> (expires_at, positions fingerprint, JSON body, ETag)
+_report_cache = {}
+_report_lock = threading.Lock()
+REPORT_TTL = 45
+REPORT_CACHE_MAX_ENTRIES = 1024
+
 @app.get("/api/report")
-def get_report(token: str, db: Session = Depends(get_db)):
-    user = get_current_user(token, db)
-    portfolio = db.query(Portfolio).filter(Portfolio.user_id == user.id).all()
-    
+def get_report(token: str, db: Session = Depends(get_db), if_none_match: str = Header(None)):
+    """Portfolio valuation, reused for REPORT_TTL while balance and positions are unchanged (ETag-aware)"""
+    user = get_current_user(token, db, load_portfolio=True)
+    portfolio = user.portfolio
+    
+    # Keyed on what the report is computed from, so a trade or deposit handled by any
+    # worker produces a fresh report instead of waiting out the TTL
+    fingerprint = (user.balance, tuple(sorted((p.symbol, p.quantity, p.avg_price) for p in portfolio)))
+    now = time.time()
+    with _report_lock:
+        expires_at, cached_fingerprint, body, etag = _report_cache.get(user.id, (0, None, None, None))
+    
+    if expires_at <= now or cached_fingerprint != fingerprint:
+        report = build_report(user, portfolio)
+        body = orjson.dumps(report)
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        # A report missing holdings whose quotes failed or timed out has wrong totals, so it is
+        # served once but not reused: the next poll retries the missing quotes
+        complete = len(report["holdings"]) == len(portfolio)
+        with _report_lock:
+            # Re-insert rather than overwrite so the entry moves to the newest end
+            _report_cache.pop(user.id, None)
+            if complete:
+                if len(_report_cache) >= REPORT_CACHE_MAX_ENTRIES:
+                    for k in [k for k, entry in _report_cache.items() if entry[0] <= now]:
+                        del _report_cache[k]
+                    # Still full: drop the oldest entries (dicts keep insertion order)
+                    while len(_report_cache) >= REPORT_CACHE_MAX_ENTRIES:
+                        del _report_cache[next(iter(_report_cache))]
+                _report_cache[user.id] = (now + REPORT_TTL, fingerprint, body, etag)
+    
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+def build_report(user: User, portfolio: list) -> dict:
+    """Value a user's positions at current prices (in USD)"""
     total_invested = 0
     total_current = 0
     holdings = []
     
+    # One batched fetch for all held symbols and one rates lookup, then value positions in memory
+    quotes = get_quotes_universal(sorted({p.symbol for p in portfolio}))
+    rates = get_currencies()
+    # USD conversion factor per quote currency, so each holding is a single multiply
+    usd_factors = {currency: convert_to_usd(1.0, currency, rates) for currency in {q.get("currency", "USD") for q in quotes.values()}}
     for p in portfolio:
-        try:
-            quote = get_quote_universal(p.symbol)
-            native_price = quote["price"]
-            stock_currency = quote.get("currency", "USD")
-            
-            # Convert current price to USD for calculations
-            current_price_usd = convert_to_usd(native_price, stock_currency)
-            
-            # avg_price is already stored in USD
-            invested = p.avg_price * p.quantity
-            current = current_price_usd * p.quantity
-            profit = current - invested
-            
-            total_invested += invested
-            total_current += current
-            
-            holdings.append({
-                "symbol": p.symbol,
-                "displaySymbol": normalize_symbol(p.symbol, for_display=True),
-                "quantity": p.quantity,
-                "avg_price": p.avg_price,  # USD
-                "current_price": current_price_usd,  # USD
-                "native_price": native_price,
-                "currency": stock_currency,
-                "invested": invested,
-                "current": current,
-                "profit": profit,
-                "profit_percent": (profit / invested * 100) if invested > 0 else 0,
-                "exchange": quote.get("exchange", "US"),
-            })
-            time.sleep(0.1)
-        except:
-            pass
+        quote = quotes.get(p.symbol)
+        if not quote:
+            continue
+        native_price = quote["price"]
+        stock_currency = quote.get("currency", "USD")
+        
+        # Convert current price to USD for calculations
+        current_price_usd = native_price * usd_factors[stock_currency]
+        
+        # avg_price is already stored in USD
+        invested = p.avg_price * p.quantity
+        current = current_price_usd * p.quantity
+        profit = current - invested
+        
+        total_invested += invested
+        total_current += current
+        
+        holdings.append({
+            "symbol": p.symbol,
+            "displaySymbol": normalize_symbol(p.symbol, for_display=True),
+            "quantity": p.quantity,
+            "avg_price": p.avg_price,  # USD
+            "current_price": current_price_usd,  # USD
+            "native_price": native_price,
+            "currency": stock_currency,
+            "invested": invested,
+            "current": current,
+            "profit": profit,
+            "profit_percent": (profit / invested * 100) if invested > 0 else 0,
+            "exchange": quote.get("exchange", "US"),
+        })
     
     return {
         "balance": user.balance,
@@ -1148,3 +1842,13 @@ def get_report(token: str, db: Session = Depends(get_db)):
         "total_profit": total_current - total_invested,
         "holdings": holdings
     }
+
+if __name__ == "__main__":
+    import uvicorn
+    
+    # The schema was set up above if requested; workers spawned below skip it
+    os.environ.pop("INIT_DB", None)
+    # Capped by default: in a container cpu_count() is the host's, and every worker brings its own
+    # refresher thread, upstream rate limiter and database pool (5 + 10 connections)
+    workers = int(os.getenv("WEB_CONCURRENCY", min(os.cpu_count() or 1, 4)))
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, loop="uvloop", http="httptools", workers=workers)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -27,6 +27,10 @@ class Portfolio(Base):
     avg_price = Column(Float)
     
     user = relationship("User", back_populates="portfolio")
+    
+    __table_args__ = (
+        Index("uq_portfolio_user_symbol", "user_id", "symbol", unique=True),
+    )
 
 class Transaction(Base):
     __tablename__ = "transactions"
@@ -41,6 +45,10 @@ class Transaction(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="transactions")
+    
+    __table_args__ = (
+        Index("ix_tx_user_created", user_id, created_at.desc()),
+    )
 
 class Favorite(Base):
     __tablename__ = "favorites"
@@ -51,3 +59,7 @@ class Favorite(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="favorites")
+    
+    __table_args__ = (
+        Index("uq_favorite_user_symbol", "user_id", "symbol", unique=True),
+    )
@@ -17,7 +17,7 @@ export const api = {
   getCurrencies: () => API.get('/currencies'),
   getMarkets: () => API.get('/markets'),
   trade: (data) => API.post(`/trade?token=${getToken()}`, data),
-  getTransactions: () => API.get(`/transactions?token=${getToken()}`),
+  getTransactions: (limit = 50, offset = 0) => API.get(`/transactions?token=${getToken()}&limit=${limit}&offset=${offset}`),
   getReport: () => API.get(`/report?token=${getToken()}`),
   getIndices: () => API.get('/indices'),
   // Account
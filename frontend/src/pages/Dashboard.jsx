@@ -97,7 +97,7 @@ export default function Dashboard({ user, onUpdate }) {
     try {
       const [reportRes, txRes, indicesRes] = await Promise.all([
         api.getReport(),
-        api.getTransactions(),
+        api.getTransactions(5),
         api.getIndices(),
       ]);
       setReport(reportRes.data);
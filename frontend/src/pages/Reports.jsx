@@ -6,6 +6,7 @@ import { PieChart, Pie, Cell, Tooltip, ResponsiveContainer } from 'recharts';
 
 const COLORS = ['#00d4aa', '#00a88a', '#007a66', '#00524a', '#ff4757', '#ff6b7a'];
 const REFRESH_INTERVAL = 3000;
+const TX_PAGE_SIZE = 50;
 
 function Skeleton({ width = '100%', height = '20px' }) {
   return <div className="skeleton" style={{ width, height }} />;
@@ -130,6 +131,8 @@ export default function Reports({ user, onUpdate }) {
   const { format, convert } = useCurrency();
   const [report, setReport] = useState(null);
   const [transactions, setTransactions] = useState([]);
+  const [hasMoreTx, setHasMoreTx] = useState(false);
+  const [loadingMoreTx, setLoadingMoreTx] = useState(false);
   const [loading, setLoading] = useState(true);
   const [selectedSymbol, setSelectedSymbol] = useState(null);
   const [favorites, setFavorites] = useState(new Set());
@@ -139,11 +142,12 @@ export default function Reports({ user, onUpdate }) {
     try {
       const [reportRes, txRes, favsRes] = await Promise.all([
         api.getReport(),
-        api.getTransactions(),
+        api.getTransactions(TX_PAGE_SIZE, 0),
         api.getFavorites()
       ]);
       setReport(reportRes.data);
       setTransactions(txRes.data);
+      setHasMoreTx(txRes.data.length === TX_PAGE_SIZE);
       setFavorites(new Set(favsRes.data || []));
       
       reportRes.data.holdings.forEach(h => {
@@ -156,6 +160,16 @@ export default function Reports({ user, onUpdate }) {
   useEffect(() => {
     fetchInitialData();
   }, [fetchInitialData]);
+
+  const loadMoreTransactions = useCallback(async () => {
+    setLoadingMoreTx(true);
+    try {
+      const { data } = await api.getTransactions(TX_PAGE_SIZE, transactions.length);
+      setTransactions(prev => [...prev, ...data]);
+      setHasMoreTx(data.length === TX_PAGE_SIZE);
+    } catch {}
+    setLoadingMoreTx(false);
+  }, [transactions.length]);
   
   const handleFavoriteToggle = useCallback((symbol, isFavorite) => {
     setFavorites(prev => {
@@ -290,6 +304,18 @@ export default function Reports({ user, onUpdate }) {
         ) : (
           <p style={{ color: 'var(--text-dim)' }}>Операций пока нет</p>
         )}
+        {hasMoreTx && (
+          <div style={{ display: 'flex', justifyContent: 'center', marginTop: '16px' }}>
+            <button
+              onClick={loadMoreTransactions}
+              className="btn btn-outline"
+              style={{ padding: '10px 24px' }}
+              disabled={loadingMoreTx}
+            >
+              {loadingMoreTx ? 'Загрузка...' : 'Загрузить ещё'}
+            </button>
+          </div>
+        )}
       </div>
 
       {/* Modal rendered at top level - not affected by HoldingRow updates */}